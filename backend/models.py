@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Text, Enum, Table
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Text, Enum, Table, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 import uuid
@@ -22,6 +22,14 @@ team_members = Table(
     Column('user_id', String, ForeignKey('users.id'))
 )
 
+class Site(Base):
+    __tablename__ = 'sites'
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    name = Column(String, nullable=False, unique=True)
+    location = Column(String, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
 class User(Base):
     __tablename__ = 'users'
     
@@ -37,10 +45,16 @@ class User(Base):
 
 class Equipment(Base):
     __tablename__ = 'equipment'
+    # Site-leading keys so per-site listings and lookups don't scan other plants
+    __table_args__ = (
+        UniqueConstraint('site_id', 'serial_number', name='uq_equipment_site_serial'),
+        Index('ix_equipment_site_team', 'site_id', 'maintenance_team_id'),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    site_id = Column(String, ForeignKey('sites.id'), nullable=False)
     name = Column(String, nullable=False)
-    serial_number = Column(String, unique=True, nullable=False)
+    serial_number = Column(String, nullable=False)
     category = Column(String, nullable=False)
     department = Column(String, nullable=True)
     assigned_to = Column(String, nullable=True)
@@ -56,9 +70,13 @@ class Equipment(Base):
 
 class MaintenanceTeam(Base):
     __tablename__ = 'maintenance_teams'
+    __table_args__ = (
+        UniqueConstraint('site_id', 'name', name='uq_teams_site_name'),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    name = Column(String, nullable=False, unique=True)
+    site_id = Column(String, ForeignKey('sites.id'), nullable=False)
+    name = Column(String, nullable=False)
     specialization = Column(String, nullable=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     
@@ -68,8 +86,14 @@ class MaintenanceTeam(Base):
 
 class MaintenanceRequest(Base):
     __tablename__ = 'maintenance_requests'
+    __table_args__ = (
+        Index('ix_requests_site_status', 'site_id', 'status'),
+        Index('ix_requests_site_type', 'site_id', 'request_type'),
+        Index('ix_requests_site_equipment', 'site_id', 'equipment_id'),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    site_id = Column(String, ForeignKey('sites.id'), nullable=False)
     subject = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     request_type = Column(Enum(RequestTypeEnum), nullable=False)
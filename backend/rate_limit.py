@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from cachetools import TLRUCache
+
+ROOT_DIR = Path(__file__).parent
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, scope, retry_after):
+        super().__init__(f"Rate limit exceeded ({scope})")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class LlmBusy(Exception):
+    """Raised when no LLM slot frees up within the queue timeout."""
+
+
+class RateLimitBackend(ABC):
+    """Token-bucket storage. Each call must refill and update a bucket atomically.
+
+    Buckets that have refilled to capacity may be dropped, since a full bucket
+    behaves exactly like a new one.
+    """
+
+    @abstractmethod
+    def consume(self, key, rate, capacity, cost=1.0):
+        """Take `cost` tokens. Returns 0.0 on success, otherwise seconds until they'd be available."""
+
+    @abstractmethod
+    def refund(self, key, rate, capacity, cost=1.0):
+        """Give back tokens taken by a request that was rejected further on."""
+
+
+def _refill(bucket, now, rate, capacity):
+    if bucket is None:
+        return capacity
+    tokens, updated = bucket
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+def _debit(tokens, rate, cost):
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+class MemoryBackend(RateLimitBackend):
+    """Buckets held in process memory; limits apply per worker."""
+
+    def __init__(self, maxsize=100_000):
+        # Each entry expires at the moment its bucket is full again
+        self._buckets = TLRUCache(maxsize, ttu=lambda key, value, now: value[2], timer=time.monotonic)
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, capacity, cost=1.0):
+        with self._lock:
+            now, tokens = self._load(key, rate, capacity)
+            tokens, wait = _debit(tokens, rate, cost)
+            self._store(key, tokens, now, rate, capacity)
+            return wait
+
+    def refund(self, key, rate, capacity, cost=1.0):
+        with self._lock:
+            now, tokens = self._load(key, rate, capacity)
+            self._store(key, min(capacity, tokens + cost), now, rate, capacity)
+
+    def __len__(self):
+        with self._lock:
+            self._buckets.expire()
+            return len(self._buckets)
+
+    def _load(self, key, rate, capacity):
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        return now, _refill(bucket and bucket[:2], now, rate, capacity)
+
+    def _store(self, key, tokens, now, rate, capacity):
+        self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+
+
+class SqliteBackend(RateLimitBackend):
+    """Buckets kept in a local SQLite file so every worker on the host shares them.
+
+    Each process keeps one connection; calls are blocking and should be run
+    off the event loop. Full buckets are deleted every `sweep_interval` seconds.
+    """
+
+    def __init__(self, path, sweep_interval=60):
+        self.path = str(path)
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._last_sweep = 0.0
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_token_buckets_full_at ON token_buckets (full_at)")
+
+    def _connection(self):
+        # A connection inherited across fork must not be reused by the child
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._pid = os.getpid()
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    def consume(self, key, rate, capacity, cost=1.0):
+        return self._update(key, rate, capacity, lambda tokens: _debit(tokens, rate, cost))
+
+    def refund(self, key, rate, capacity, cost=1.0):
+        self._update(key, rate, capacity, lambda tokens: (min(capacity, tokens + cost), None))
+
+    def __len__(self):
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM token_buckets").fetchone()[0]
+
+    def _update(self, key, rate, capacity, apply):
+        # Wall clock, since monotonic time is not comparable across processes
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                if now - self._last_sweep >= self.sweep_interval:
+                    conn.execute("DELETE FROM token_buckets WHERE full_at <= ?", (now,))
+                    self._last_sweep = now
+                row = conn.execute(
+                    "SELECT tokens, updated FROM token_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, result = apply(_refill(row, now, rate, capacity))
+                conn.execute(
+                    "INSERT OR REPLACE INTO token_buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)",
+                    (key, tokens, now, now + (capacity - tokens) / rate),
+                )
+                conn.execute("COMMIT")
+                return result
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+
+
+def create_backend():
+    name = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'sqlite':
+        return SqliteBackend(os.environ.get('RATE_LIMIT_SQLITE_PATH', ROOT_DIR / 'rate_limit.db'))
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {name}")
+
+
+class ChatLimiter:
+    """Guards outbound LLM calls for the chat endpoint.
+
+    - per-session and global token buckets (rate in requests/second, burst capacity)
+    - a semaphore capping concurrent LLM calls; callers queue for a slot up to
+      `queue_timeout` seconds and each call is cut off after `call_timeout`
+    - identical prompts already in flight share one LLM call (per worker)
+    """
+
+    def __init__(self, backend, session_rate, session_burst, global_rate, global_burst,
+                 max_concurrency, queue_timeout, call_timeout):
+        if session_rate <= 0 or global_rate <= 0:
+            raise ValueError("Chat rate limits must be greater than 0")
+        if session_burst < 1 or global_burst < 1:
+            raise ValueError("Chat burst sizes must be at least 1")
+        if max_concurrency < 1:
+            raise ValueError("CHAT_MAX_CONCURRENCY must be at least 1")
+        self.backend = backend
+        self.session_rate = session_rate
+        self.session_burst = session_burst
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = {}
+
+    async def check(self, session_id):
+        # Session bucket first so one noisy session can't drain the global budget
+        session_key = f"session:{session_id}"
+        wait = await self._consume(session_key, self.session_rate, self.session_burst)
+        if wait:
+            raise RateLimitExceeded("session", wait)
+        wait = await self._consume("global", self.global_rate, self.global_burst)
+        if wait:
+            # The request never ran, so it shouldn't count against the session
+            await self._backend_call(self.backend.refund, session_key, self.session_rate, self.session_burst)
+            raise RateLimitExceeded("global", wait)
+
+    async def _consume(self, key, rate, capacity):
+        # Fail open; the concurrency cap still bounds outbound LLM calls
+        return await self._backend_call(self.backend.consume, key, rate, capacity) or 0.0
+
+    async def _backend_call(self, method, *args):
+        try:
+            return await asyncio.to_thread(method, *args)
+        except Exception as e:
+            logger.warning(f"Rate limit backend error, allowing request: {e}")
+            return None
+
+    async def run(self, key, factory):
+        """Run `factory()` under the concurrency limit, coalescing on `key`."""
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        task = self._in_flight.get(digest)
+        if task is None:
+            task = asyncio.ensure_future(self._call(factory))
+            self._in_flight[digest] = task
+            task.add_done_callback(lambda t: self._finish(digest, t))
+        # Shield so a disconnecting client doesn't cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _finish(self, digest, task):
+        self._in_flight.pop(digest, None)
+        # Retrieve the exception so it isn't logged when every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def _call(self, factory):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LlmBusy("All LLM slots are busy")
+        try:
+            return await asyncio.wait_for(factory(), self.call_timeout)
+        finally:
+            self._semaphore.release()
+
+
+def create_chat_limiter():
+    env = os.environ.get
+    return ChatLimiter(
+        backend=create_backend(),
+        session_rate=float(env('CHAT_SESSION_RATE', '0.2')),
+        session_burst=float(env('CHAT_SESSION_BURST', '5')),
+        global_rate=float(env('CHAT_GLOBAL_RATE', '2')),
+        global_burst=float(env('CHAT_GLOBAL_BURST', '20')),
+        max_concurrency=int(env('CHAT_MAX_CONCURRENCY', '4')),
+        queue_timeout=float(env('CHAT_QUEUE_TIMEOUT', '10')),
+        call_timeout=float(env('CHAT_CALL_TIMEOUT', '60')),
+    )
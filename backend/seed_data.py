@@ -1,5 +1,5 @@
 import asyncio
-from database import SessionLocal, init_db
+from database import DEFAULT_SITE_ID, SessionLocal, init_db
 from models import User, Equipment, MaintenanceTeam, MaintenanceRequest, RequestTypeEnum, RequestStatusEnum
 from datetime import datetime, timedelta, timezone
 
@@ -21,9 +21,9 @@ def seed_database():
         
         # Create maintenance teams
         teams = [
-            MaintenanceTeam(name="Mechanical Team", specialization="Mechanical Equipment"),
-            MaintenanceTeam(name="Electrical Team", specialization="Electrical Systems"),
-            MaintenanceTeam(name="IT Support", specialization="Computer Equipment"),
+            MaintenanceTeam(site_id=DEFAULT_SITE_ID, name="Mechanical Team", specialization="Mechanical Equipment"),
+            MaintenanceTeam(site_id=DEFAULT_SITE_ID, name="Electrical Team", specialization="Electrical Systems"),
+            MaintenanceTeam(site_id=DEFAULT_SITE_ID, name="IT Support", specialization="Computer Equipment"),
         ]
         db.add_all(teams)
         db.commit()
@@ -38,6 +38,7 @@ def seed_database():
         # Create equipment
         equipment_list = [
             Equipment(
+                site_id=DEFAULT_SITE_ID,
                 name="CNC Machine #1",
                 serial_number="CNC-2024-001",
                 category="Production",
@@ -47,6 +48,7 @@ def seed_database():
                 image_url="https://images.pexels.com/photos/35383624/pexels-photo-35383624.jpeg"
             ),
             Equipment(
+                site_id=DEFAULT_SITE_ID,
                 name="Hydraulic Press",
                 serial_number="HP-2024-002",
                 category="Production",
@@ -56,6 +58,7 @@ def seed_database():
                 image_url="https://images.pexels.com/photos/35383624/pexels-photo-35383624.jpeg"
             ),
             Equipment(
+                site_id=DEFAULT_SITE_ID,
                 name="Generator #3",
                 serial_number="GEN-2024-003",
                 category="Power",
@@ -65,6 +68,7 @@ def seed_database():
                 image_url="https://images.pexels.com/photos/35383624/pexels-photo-35383624.jpeg"
             ),
             Equipment(
+                site_id=DEFAULT_SITE_ID,
                 name="Server Rack #1",
                 serial_number="SRV-2024-004",
                 category="IT",
@@ -75,6 +79,7 @@ def seed_database():
                 image_url="https://images.pexels.com/photos/35383624/pexels-photo-35383624.jpeg"
             ),
             Equipment(
+                site_id=DEFAULT_SITE_ID,
                 name="Conveyor Belt System",
                 serial_number="CBS-2024-005",
                 category="Production",
@@ -91,6 +96,7 @@ def seed_database():
         # Create maintenance requests
         requests = [
             MaintenanceRequest(
+                site_id=DEFAULT_SITE_ID,
                 subject="Oil Leak in CNC Machine",
                 description="Machine is leaking hydraulic oil near the base. Needs immediate attention.",
                 request_type=RequestTypeEnum.CORRECTIVE,
@@ -100,6 +106,7 @@ def seed_database():
                 priority="High"
             ),
             MaintenanceRequest(
+                site_id=DEFAULT_SITE_ID,
                 subject="Routine Maintenance - Hydraulic Press",
                 description="Scheduled quarterly maintenance check.",
                 request_type=RequestTypeEnum.PREVENTIVE,
@@ -111,6 +118,7 @@ def seed_database():
                 priority="Medium"
             ),
             MaintenanceRequest(
+                site_id=DEFAULT_SITE_ID,
                 subject="Generator Battery Replacement",
                 description="Backup batteries showing low voltage, need replacement.",
                 request_type=RequestTypeEnum.PREVENTIVE,
@@ -121,6 +129,7 @@ def seed_database():
                 priority="High"
             ),
             MaintenanceRequest(
+                site_id=DEFAULT_SITE_ID,
                 subject="Server Cooling Fan Failure",
                 description="Server rack cooling fan #2 has stopped working.",
                 request_type=RequestTypeEnum.CORRECTIVE,
@@ -131,6 +140,7 @@ def seed_database():
                 priority="High"
             ),
             MaintenanceRequest(
+                site_id=DEFAULT_SITE_ID,
                 subject="Conveyor Belt Alignment Check",
                 description="Monthly preventive check for belt alignment and tension.",
                 request_type=RequestTypeEnum.PREVENTIVE,
@@ -143,6 +153,7 @@ def seed_database():
                 priority="Low"
             ),
             MaintenanceRequest(
+                site_id=DEFAULT_SITE_ID,
                 subject="Lubrication Service - CNC Machine",
                 description="Weekly lubrication and cleaning service.",
                 request_type=RequestTypeEnum.PREVENTIVE,
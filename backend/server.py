@@ -1,16 +1,21 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from database import get_db, init_db
-from models import User, Equipment, MaintenanceTeam, MaintenanceRequest, ChatHistory, RequestTypeEnum, RequestStatusEnum
+from cachetools import TTLCache
+from database import DEFAULT_SITE_ID, SessionLocal, get_db, init_db
+from models import Site, User, Equipment, MaintenanceTeam, MaintenanceRequest, ChatHistory, RequestTypeEnum, RequestStatusEnum
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime, timezone
+import asyncio
 import logging
 import os
 from dotenv import load_dotenv
 from pathlib import Path
 from emergentintegrations.llm.chat import LlmChat, UserMessage
+from rate_limit import LlmBusy, RateLimitExceeded, create_chat_limiter
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -21,7 +26,30 @@ api_router = APIRouter(prefix="/api")
 # Initialize database
 init_db()
 
+chat_limiter = create_chat_limiter()
+
+# Per-site dashboard stats; writes evict their site, the TTL bounds staleness across workers
+stats_cache = TTLCache(maxsize=256, ttl=float(os.environ.get('STATS_CACHE_TTL', '30')))
+
+def get_site_id(x_site_id: str = Header(DEFAULT_SITE_ID), db: Session = Depends(get_db)) -> str:
+    if not db.get(Site, x_site_id):
+        raise HTTPException(status_code=404, detail="Site not found")
+    return x_site_id
+
 # Pydantic models for requests/responses
+class SiteCreate(BaseModel):
+    name: str
+    location: Optional[str] = None
+
+class SiteResponse(BaseModel):
+    id: str
+    name: str
+    location: Optional[str]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
 class UserCreate(BaseModel):
     name: str
     email: str
@@ -46,6 +74,7 @@ class TeamCreate(BaseModel):
 
 class TeamResponse(BaseModel):
     id: str
+    site_id: str
     name: str
     specialization: Optional[str]
     members: List[UserResponse]
@@ -68,6 +97,7 @@ class EquipmentCreate(BaseModel):
 
 class EquipmentResponse(BaseModel):
     id: str
+    site_id: str
     name: str
     serial_number: str
     category: str
@@ -102,6 +132,7 @@ class RequestUpdate(BaseModel):
 
 class RequestResponse(BaseModel):
     id: str
+    site_id: str
     subject: str
     description: Optional[str]
     request_type: str
@@ -134,11 +165,35 @@ class DashboardStats(BaseModel):
     requests_by_status: dict
     requests_by_type: dict
 
+def check_team_site(db: Session, site_id: str, team_id: Optional[str]):
+    if team_id and not db.query(MaintenanceTeam).filter(
+        MaintenanceTeam.site_id == site_id, MaintenanceTeam.id == team_id
+    ).first():
+        raise HTTPException(status_code=404, detail="Team not found")
+
 # Routes
 @api_router.get("/")
 async def root():
     return {"message": "GearGuard API"}
 
+# Site endpoints
+@api_router.post("/sites", response_model=SiteResponse)
+async def create_site(site: SiteCreate, db: Session = Depends(get_db)):
+    db_site = Site(**site.model_dump())
+    db.add(db_site)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Site already exists")
+    db.refresh(db_site)
+    return db_site
+
+@api_router.get("/sites", response_model=List[SiteResponse])
+async def get_sites(db: Session = Depends(get_db)):
+    sites = db.query(Site).all()
+    return sites
+
 # User endpoints
 @api_router.post("/users", response_model=UserResponse)
 async def create_user(user: UserCreate, db: Session = Depends(get_db)):
@@ -162,8 +217,8 @@ async def get_user(user_id: str, db: Session = Depends(get_db)):
 
 # Team endpoints
 @api_router.post("/teams", response_model=TeamResponse)
-async def create_team(team: TeamCreate, db: Session = Depends(get_db)):
-    db_team = MaintenanceTeam(name=team.name, specialization=team.specialization)
+async def create_team(team: TeamCreate, site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    db_team = MaintenanceTeam(site_id=site_id, name=team.name, specialization=team.specialization)
     
     if team.member_ids:
         members = db.query(User).filter(User.id.in_(team.member_ids)).all()
@@ -172,23 +227,24 @@ async def create_team(team: TeamCreate, db: Session = Depends(get_db)):
     db.add(db_team)
     db.commit()
     db.refresh(db_team)
+    stats_cache.pop(site_id, None)
     return db_team
 
 @api_router.get("/teams", response_model=List[TeamResponse])
-async def get_teams(db: Session = Depends(get_db)):
-    teams = db.query(MaintenanceTeam).all()
+async def get_teams(site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    teams = db.query(MaintenanceTeam).filter(MaintenanceTeam.site_id == site_id).all()
     return teams
 
 @api_router.get("/teams/{team_id}", response_model=TeamResponse)
-async def get_team(team_id: str, db: Session = Depends(get_db)):
-    team = db.query(MaintenanceTeam).filter(MaintenanceTeam.id == team_id).first()
+async def get_team(team_id: str, site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    team = db.query(MaintenanceTeam).filter(MaintenanceTeam.site_id == site_id, MaintenanceTeam.id == team_id).first()
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
     return team
 
 @api_router.put("/teams/{team_id}", response_model=TeamResponse)
-async def update_team(team_id: str, team: TeamCreate, db: Session = Depends(get_db)):
-    db_team = db.query(MaintenanceTeam).filter(MaintenanceTeam.id == team_id).first()
+async def update_team(team_id: str, team: TeamCreate, site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    db_team = db.query(MaintenanceTeam).filter(MaintenanceTeam.site_id == site_id, MaintenanceTeam.id == team_id).first()
     if not db_team:
         raise HTTPException(status_code=404, detail="Team not found")
     
@@ -205,30 +261,33 @@ async def update_team(team_id: str, team: TeamCreate, db: Session = Depends(get_
 
 # Equipment endpoints
 @api_router.post("/equipment", response_model=EquipmentResponse)
-async def create_equipment(equipment: EquipmentCreate, db: Session = Depends(get_db)):
-    db_equipment = Equipment(**equipment.model_dump())
+async def create_equipment(equipment: EquipmentCreate, site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    check_team_site(db, site_id, equipment.maintenance_team_id)
+    db_equipment = Equipment(**equipment.model_dump(), site_id=site_id)
     db.add(db_equipment)
     db.commit()
     db.refresh(db_equipment)
+    stats_cache.pop(site_id, None)
     return db_equipment
 
 @api_router.get("/equipment", response_model=List[EquipmentResponse])
-async def get_equipment(db: Session = Depends(get_db)):
-    equipment = db.query(Equipment).all()
+async def get_equipment(site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    equipment = db.query(Equipment).filter(Equipment.site_id == site_id).all()
     return equipment
 
 @api_router.get("/equipment/{equipment_id}", response_model=EquipmentResponse)
-async def get_equipment_by_id(equipment_id: str, db: Session = Depends(get_db)):
-    equipment = db.query(Equipment).filter(Equipment.id == equipment_id).first()
+async def get_equipment_by_id(equipment_id: str, site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    equipment = db.query(Equipment).filter(Equipment.site_id == site_id, Equipment.id == equipment_id).first()
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
     return equipment
 
 @api_router.put("/equipment/{equipment_id}", response_model=EquipmentResponse)
-async def update_equipment(equipment_id: str, equipment: EquipmentCreate, db: Session = Depends(get_db)):
-    db_equipment = db.query(Equipment).filter(Equipment.id == equipment_id).first()
+async def update_equipment(equipment_id: str, equipment: EquipmentCreate, site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    db_equipment = db.query(Equipment).filter(Equipment.site_id == site_id, Equipment.id == equipment_id).first()
     if not db_equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
+    check_team_site(db, site_id, equipment.maintenance_team_id)
     
     for key, value in equipment.model_dump().items():
         setattr(db_equipment, key, value)
@@ -238,47 +297,50 @@ async def update_equipment(equipment_id: str, equipment: EquipmentCreate, db: Se
     return db_equipment
 
 @api_router.delete("/equipment/{equipment_id}")
-async def delete_equipment(equipment_id: str, db: Session = Depends(get_db)):
-    db_equipment = db.query(Equipment).filter(Equipment.id == equipment_id).first()
+async def delete_equipment(equipment_id: str, site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    db_equipment = db.query(Equipment).filter(Equipment.site_id == site_id, Equipment.id == equipment_id).first()
     if not db_equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
     
     db.delete(db_equipment)
     db.commit()
+    stats_cache.pop(site_id, None)
     return {"message": "Equipment deleted successfully"}
 
 # Maintenance Request endpoints
 @api_router.post("/requests", response_model=RequestResponse)
-async def create_request(request: RequestCreate, db: Session = Depends(get_db)):
+async def create_request(request: RequestCreate, site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
     # Get equipment to auto-fill team
-    equipment = db.query(Equipment).filter(Equipment.id == request.equipment_id).first()
+    equipment = db.query(Equipment).filter(Equipment.site_id == site_id, Equipment.id == request.equipment_id).first()
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
     
     db_request = MaintenanceRequest(
         **request.model_dump(),
+        site_id=site_id,
         maintenance_team_id=equipment.maintenance_team_id
     )
     db.add(db_request)
     db.commit()
     db.refresh(db_request)
+    stats_cache.pop(site_id, None)
     return db_request
 
 @api_router.get("/requests", response_model=List[RequestResponse])
-async def get_requests(db: Session = Depends(get_db)):
-    requests = db.query(MaintenanceRequest).all()
+async def get_requests(site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    requests = db.query(MaintenanceRequest).filter(MaintenanceRequest.site_id == site_id).all()
     return requests
 
 @api_router.get("/requests/{request_id}", response_model=RequestResponse)
-async def get_request(request_id: str, db: Session = Depends(get_db)):
-    request = db.query(MaintenanceRequest).filter(MaintenanceRequest.id == request_id).first()
+async def get_request(request_id: str, site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    request = db.query(MaintenanceRequest).filter(MaintenanceRequest.site_id == site_id, MaintenanceRequest.id == request_id).first()
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
     return request
 
 @api_router.put("/requests/{request_id}", response_model=RequestResponse)
-async def update_request(request_id: str, request: RequestUpdate, db: Session = Depends(get_db)):
-    db_request = db.query(MaintenanceRequest).filter(MaintenanceRequest.id == request_id).first()
+async def update_request(request_id: str, request: RequestUpdate, site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    db_request = db.query(MaintenanceRequest).filter(MaintenanceRequest.site_id == site_id, MaintenanceRequest.id == request_id).first()
     if not db_request:
         raise HTTPException(status_code=404, detail="Request not found")
     
@@ -288,59 +350,64 @@ async def update_request(request_id: str, request: RequestUpdate, db: Session =
     db_request.updated_at = datetime.now(timezone.utc)
     db.commit()
     db.refresh(db_request)
+    stats_cache.pop(site_id, None)
     return db_request
 
 @api_router.delete("/requests/{request_id}")
-async def delete_request(request_id: str, db: Session = Depends(get_db)):
-    db_request = db.query(MaintenanceRequest).filter(MaintenanceRequest.id == request_id).first()
+async def delete_request(request_id: str, site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    db_request = db.query(MaintenanceRequest).filter(MaintenanceRequest.site_id == site_id, MaintenanceRequest.id == request_id).first()
     if not db_request:
         raise HTTPException(status_code=404, detail="Request not found")
     
     db.delete(db_request)
     db.commit()
+    stats_cache.pop(site_id, None)
     return {"message": "Request deleted successfully"}
 
 @api_router.get("/equipment/{equipment_id}/requests", response_model=List[RequestResponse])
-async def get_equipment_requests(equipment_id: str, db: Session = Depends(get_db)):
-    requests = db.query(MaintenanceRequest).filter(MaintenanceRequest.equipment_id == equipment_id).all()
+async def get_equipment_requests(equipment_id: str, site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    requests = db.query(MaintenanceRequest).filter(
+        MaintenanceRequest.site_id == site_id,
+        MaintenanceRequest.equipment_id == equipment_id
+    ).all()
     return requests
 
 # Dashboard stats
 @api_router.get("/dashboard/stats", response_model=DashboardStats)
-async def get_dashboard_stats(db: Session = Depends(get_db)):
-    total_equipment = db.query(Equipment).count()
-    total_requests = db.query(MaintenanceRequest).count()
-    active_requests = db.query(MaintenanceRequest).filter(
-        MaintenanceRequest.status.in_([RequestStatusEnum.NEW, RequestStatusEnum.IN_PROGRESS])
-    ).count()
-    teams_count = db.query(MaintenanceTeam).count()
+async def get_dashboard_stats(site_id: str = Depends(get_site_id), db: Session = Depends(get_db)):
+    cached = stats_cache.get(site_id)
+    if cached is not None:
+        return cached
     
-    requests_by_status = {}
-    for status in RequestStatusEnum:
-        count = db.query(MaintenanceRequest).filter(MaintenanceRequest.status == status).count()
-        requests_by_status[status.value] = count
+    total_equipment = db.query(Equipment).filter(Equipment.site_id == site_id).count()
+    teams_count = db.query(MaintenanceTeam).filter(MaintenanceTeam.site_id == site_id).count()
     
-    requests_by_type = {}
-    for req_type in RequestTypeEnum:
-        count = db.query(MaintenanceRequest).filter(MaintenanceRequest.request_type == req_type).count()
-        requests_by_type[req_type.value] = count
+    status_counts = dict(
+        db.query(MaintenanceRequest.status, func.count())
+        .filter(MaintenanceRequest.site_id == site_id)
+        .group_by(MaintenanceRequest.status)
+        .all()
+    )
+    type_counts = dict(
+        db.query(MaintenanceRequest.request_type, func.count())
+        .filter(MaintenanceRequest.site_id == site_id)
+        .group_by(MaintenanceRequest.request_type)
+        .all()
+    )
     
-    return DashboardStats(
+    stats = DashboardStats(
         total_equipment=total_equipment,
-        total_requests=total_requests,
-        active_requests=active_requests,
+        total_requests=sum(status_counts.values()),
+        active_requests=status_counts.get(RequestStatusEnum.NEW, 0) + status_counts.get(RequestStatusEnum.IN_PROGRESS, 0),
         teams_count=teams_count,
-        requests_by_status=requests_by_status,
-        requests_by_type=requests_by_type
+        requests_by_status={status.value: status_counts.get(status, 0) for status in RequestStatusEnum},
+        requests_by_type={req_type.value: type_counts.get(req_type, 0) for req_type in RequestTypeEnum}
     )
+    stats_cache[site_id] = stats
+    return stats
 
 # AI Chatbot endpoint
-@api_router.post("/chat", response_model=ChatResponse)
-async def chat(chat_request: ChatRequest, db: Session = Depends(get_db)):
-    try:
-        api_key = os.environ.get('EMERGENT_LLM_KEY')
-        
-        system_message = """You are a helpful AI assistant for GearGuard, a maintenance tracking system.
+CHAT_SYSTEM_MESSAGE = """You are a helpful AI assistant for GearGuard, a maintenance tracking system.
         You can help users with:
         1. Answering FAQs about maintenance management
         2. Providing smart suggestions for preventive maintenance schedules
@@ -348,31 +415,52 @@ async def chat(chat_request: ChatRequest, db: Session = Depends(get_db)):
         4. General guidance on using the application
         
         Be helpful, concise, and professional."""
-        
+
+@api_router.post("/chat", response_model=ChatResponse)
+async def chat(chat_request: ChatRequest):
+    try:
+        await chat_limiter.check(chat_request.session_id)
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
+
+    async def generate():
         chat = LlmChat(
-            api_key=api_key,
+            api_key=os.environ.get('EMERGENT_LLM_KEY'),
             session_id=chat_request.session_id,
-            system_message=system_message
+            system_message=CHAT_SYSTEM_MESSAGE
         ).with_model("openai", "gpt-4o")
-        
-        user_message = UserMessage(text=chat_request.message)
-        response = await chat.send_message(user_message)
-        
-        chat_history = ChatHistory(
+        return await chat.send_message(UserMessage(text=chat_request.message))
+
+    try:
+        response = await chat_limiter.run(chat_request.message, generate)
+    except LlmBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Chat error: LLM call timed out")
+    except Exception as e:
+        logging.error(f"Chat error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
+
+    # Only hold a DB session for the history write, not for the whole generation
+    db = SessionLocal()
+    try:
+        db.add(ChatHistory(
             session_id=chat_request.session_id,
             user_message=chat_request.message,
             ai_response=response
-        )
-        db.add(chat_history)
+        ))
         db.commit()
-        
-        return ChatResponse(
-            response=response,
-            session_id=chat_request.session_id
-        )
-    except Exception as e:
-        logging.error(f"Chat error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
+    finally:
+        db.close()
+
+    return ChatResponse(
+        response=response,
+        session_id=chat_request.session_id
+    )
 
 app.include_router(api_router)
 
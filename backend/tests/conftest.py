@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Point the app at a throwaway SQLite file before database.py reads the env
+os.environ['POSTGRES_URL'] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'gearguard_test.db'}"
+
+try:
+    import emergentintegrations.llm.chat  # noqa: F401
+except ImportError:
+    # Chat tests patch in a fake client; the placeholder only lets server.py import
+    chat_module = types.ModuleType('emergentintegrations.llm.chat')
+    chat_module.LlmChat = chat_module.UserMessage = object
+    sys.modules['emergentintegrations'] = types.ModuleType('emergentintegrations')
+    sys.modules['emergentintegrations.llm'] = types.ModuleType('emergentintegrations.llm')
+    sys.modules['emergentintegrations.llm.chat'] = chat_module
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    import server
+    from database import Base, engine, init_db
+
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+    server.stats_cache.clear()
+    with TestClient(server.app) as client:
+        yield client
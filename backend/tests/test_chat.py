@@ -0,0 +1,113 @@
+import asyncio
+import types
+
+import pytest
+
+import server
+from database import SessionLocal
+from models import ChatHistory
+from rate_limit import ChatLimiter, MemoryBackend
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Replaces the LLM client; `llm.reply` is awaited with each message text."""
+    state = types.SimpleNamespace(calls=[], sessions_opened=[], sessions_during_call=[])
+
+    async def reply(text):
+        return f"echo: {text}"
+
+    state.reply = reply
+
+    class FakeChat:
+        def __init__(self, **kwargs):
+            pass
+
+        def with_model(self, provider, model):
+            return self
+
+        async def send_message(self, message):
+            state.calls.append(message.text)
+            state.sessions_during_call.append(len(state.sessions_opened))
+            return await state.reply(message.text)
+
+    def tracked_session():
+        state.sessions_opened.append(True)
+        return SessionLocal()
+
+    monkeypatch.setattr(server, "LlmChat", FakeChat)
+    monkeypatch.setattr(server, "UserMessage", types.SimpleNamespace)
+    monkeypatch.setattr(server, "SessionLocal", tracked_session)
+    return state
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    def install(**overrides):
+        options = dict(
+            session_rate=0.01, session_burst=5, global_rate=0.01, global_burst=50,
+            max_concurrency=2, queue_timeout=0.05, call_timeout=1,
+        )
+        options.update(overrides)
+        chat_limiter = ChatLimiter(MemoryBackend(), **options)
+        monkeypatch.setattr(server, "chat_limiter", chat_limiter)
+        return chat_limiter
+
+    return install
+
+
+def history():
+    db = SessionLocal()
+    try:
+        return [(row.session_id, row.user_message, row.ai_response) for row in db.query(ChatHistory).all()]
+    finally:
+        db.close()
+
+
+def test_chat_writes_history_after_generation(client, llm, limiter):
+    limiter()
+    response = client.post("/api/chat", json={"message": "hi", "session_id": "s1"})
+
+    assert response.status_code == 200
+    assert response.json() == {"response": "echo: hi", "session_id": "s1"}
+    assert history() == [("s1", "hi", "echo: hi")]
+    # No DB session is held while the LLM generates
+    assert llm.sessions_during_call == [0]
+    assert len(llm.sessions_opened) == 1
+
+
+def test_chat_rate_limited_returns_429_with_retry_after(client, llm, limiter):
+    limiter(session_burst=1)
+    assert client.post("/api/chat", json={"message": "hi", "session_id": "s1"}).status_code == 200
+
+    response = client.post("/api/chat", json={"message": "again", "session_id": "s1"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert llm.calls == ["hi"]
+    assert len(history()) == 1
+
+
+def test_chat_busy_returns_503(client, llm, limiter):
+    chat_limiter = limiter(max_concurrency=1)
+    # Take the only slot so the request times out waiting in the queue
+    asyncio.run(chat_limiter._semaphore.acquire())
+
+    response = client.post("/api/chat", json={"message": "hi", "session_id": "s1"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert llm.calls == []
+    assert history() == []
+
+
+def test_chat_llm_timeout_returns_504(client, llm, limiter):
+    limiter(call_timeout=0.05)
+
+    async def slow_reply(text):
+        await asyncio.sleep(1)
+
+    llm.reply = slow_reply
+
+    response = client.post("/api/chat", json={"message": "hi", "session_id": "s1"})
+    assert response.status_code == 504
+    assert llm.sessions_opened == []
+    assert history() == []
@@ -0,0 +1,89 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+TEST_POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+
+pytestmark = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Schema as created before multi-site support
+LEGACY_SCHEMA = """
+CREATE TABLE users (
+    id VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, email VARCHAR NOT NULL UNIQUE,
+    role VARCHAR, avatar VARCHAR, created_at TIMESTAMP
+);
+CREATE TABLE maintenance_teams (
+    id VARCHAR PRIMARY KEY, name VARCHAR NOT NULL UNIQUE, specialization VARCHAR, created_at TIMESTAMP
+);
+CREATE TABLE equipment (
+    id VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, serial_number VARCHAR NOT NULL UNIQUE,
+    category VARCHAR NOT NULL, department VARCHAR, assigned_to VARCHAR, location VARCHAR NOT NULL,
+    purchase_date TIMESTAMP, warranty_expiry TIMESTAMP,
+    maintenance_team_id VARCHAR REFERENCES maintenance_teams(id), image_url VARCHAR, created_at TIMESTAMP
+);
+CREATE TYPE requesttypeenum AS ENUM ('CORRECTIVE', 'PREVENTIVE');
+CREATE TYPE requeststatusenum AS ENUM ('NEW', 'IN_PROGRESS', 'REPAIRED', 'SCRAP');
+CREATE TABLE maintenance_requests (
+    id VARCHAR PRIMARY KEY, subject VARCHAR NOT NULL, description TEXT,
+    request_type requesttypeenum NOT NULL, status requeststatusenum,
+    equipment_id VARCHAR NOT NULL REFERENCES equipment(id),
+    maintenance_team_id VARCHAR REFERENCES maintenance_teams(id),
+    assigned_user_id VARCHAR REFERENCES users(id),
+    scheduled_date TIMESTAMP, duration_hours FLOAT, priority VARCHAR,
+    created_at TIMESTAMP, updated_at TIMESTAMP
+);
+INSERT INTO maintenance_teams (id, name) VALUES ('t1', 'Mechanical');
+INSERT INTO equipment (id, name, serial_number, category, location, maintenance_team_id)
+    VALUES ('e1', 'Press', 'SN-1', 'Production', 'Floor A', 't1');
+INSERT INTO maintenance_requests (id, subject, request_type, status, equipment_id)
+    VALUES ('r1', 'Leak', 'CORRECTIVE', 'NEW', 'e1');
+"""
+
+
+@pytest.fixture
+def legacy_db():
+    engine = create_engine(TEST_POSTGRES_URL)
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+        conn.execute(text(LEGACY_SCHEMA))
+    yield engine
+    engine.dispose()
+
+
+def boot_workers(count):
+    env = dict(os.environ, POSTGRES_URL=TEST_POSTGRES_URL)
+    workers = [
+        subprocess.Popen([sys.executable, "-c", "import database; database.init_db()"],
+                         cwd=BACKEND_DIR, env=env, stderr=subprocess.PIPE, text=True)
+        for _ in range(count)
+    ]
+    for worker in workers:
+        _, stderr = worker.communicate(timeout=60)
+        assert worker.returncode == 0, stderr
+
+
+def test_concurrent_workers_migrate_legacy_schema(legacy_db):
+    boot_workers(4)
+    boot_workers(1)
+
+    inspector = inspect(legacy_db)
+    for table in ('equipment', 'maintenance_teams', 'maintenance_requests'):
+        site_id = next(c for c in inspector.get_columns(table) if c['name'] == 'site_id')
+        assert not site_id['nullable']
+
+    assert {c['name'] for c in inspector.get_unique_constraints('equipment')} == {'uq_equipment_site_serial'}
+    assert {c['name'] for c in inspector.get_unique_constraints('maintenance_teams')} == {'uq_teams_site_name'}
+    assert {i['name'] for i in inspector.get_indexes('maintenance_requests')} >= {
+        'ix_requests_site_status', 'ix_requests_site_type', 'ix_requests_site_equipment'
+    }
+
+    with legacy_db.connect() as conn:
+        assert conn.execute(text("SELECT id FROM sites")).scalars().all() == ['default']
+        for table in ('equipment', 'maintenance_teams', 'maintenance_requests'):
+            assert conn.execute(text(f"SELECT DISTINCT site_id FROM {table}")).scalars().all() == ['default']
@@ -0,0 +1,200 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from rate_limit import ChatLimiter, LlmBusy, MemoryBackend, RateLimitExceeded, SqliteBackend
+
+
+def make_limiter(backend=None, **overrides):
+    options = dict(
+        session_rate=1, session_burst=2, global_rate=1, global_burst=10,
+        max_concurrency=1, queue_timeout=0.05, call_timeout=1,
+    )
+    options.update(overrides)
+    return ChatLimiter(backend or MemoryBackend(), **options)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryBackend()
+    else:
+        backend = SqliteBackend(tmp_path / "buckets.db")
+        yield backend
+        backend.close()
+
+
+def test_bucket_allows_burst_then_rejects(backend):
+    assert backend.consume("k", rate=1, capacity=2) == 0.0
+    assert backend.consume("k", rate=1, capacity=2) == 0.0
+    wait = backend.consume("k", rate=1, capacity=2)
+    assert 0.9 < wait <= 1.0
+
+
+def test_bucket_refills_over_time(backend, monkeypatch):
+    # Start from the real clocks so the cache's own expiry timer stays consistent
+    offset = [0.0]
+    monotonic, wall = time.monotonic(), time.time()
+    monkeypatch.setattr("rate_limit.time.monotonic", lambda: monotonic + offset[0])
+    monkeypatch.setattr("rate_limit.time.time", lambda: wall + offset[0])
+    backend.consume("k", rate=2, capacity=1)
+    assert backend.consume("k", rate=2, capacity=1) == pytest.approx(0.5)
+    offset[0] += 0.5
+    assert backend.consume("k", rate=2, capacity=1) == 0.0
+
+
+def test_refund_returns_tokens_up_to_capacity(backend):
+    backend.consume("k", rate=0.01, capacity=1)
+    backend.refund("k", rate=0.01, capacity=1)
+    backend.refund("k", rate=0.01, capacity=1)
+    assert backend.consume("k", rate=0.01, capacity=1) == 0.0
+    assert backend.consume("k", rate=0.01, capacity=1) > 0
+
+
+def test_memory_backend_drops_refilled_buckets():
+    backend = MemoryBackend()
+    for i in range(500):
+        backend.consume(f"session:{i}", rate=1000, capacity=1)
+    time.sleep(0.01)
+    assert len(backend) == 0
+
+
+def test_memory_backend_is_bounded():
+    backend = MemoryBackend(maxsize=10)
+    for i in range(100):
+        backend.consume(f"session:{i}", rate=0.01, capacity=1)
+    assert len(backend) == 10
+
+
+def test_sqlite_backend_sweeps_refilled_buckets(tmp_path):
+    backend = SqliteBackend(tmp_path / "buckets.db", sweep_interval=0)
+    for i in range(500):
+        backend.consume(f"session:{i}", rate=1000, capacity=1)
+    time.sleep(0.01)
+    backend.consume("latest", rate=0.01, capacity=1)
+    assert len(backend) == 1
+    backend.close()
+
+
+def test_buckets_are_independent_per_key(backend):
+    backend.consume("a", rate=1, capacity=1)
+    assert backend.consume("b", rate=1, capacity=1) == 0.0
+
+
+def test_sqlite_backend_survives_held_lock(tmp_path):
+    path = tmp_path / "buckets.db"
+    backend = SqliteBackend(path)
+    backend._connection().execute("PRAGMA busy_timeout = 0")
+    other = sqlite3.connect(str(path), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            backend.consume("k", rate=1, capacity=1)
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    assert backend.consume("k", rate=1, capacity=1) == 0.0
+    backend.close()
+
+
+def test_check_rejects_session_over_limit():
+    limiter = make_limiter()
+
+    async def scenario():
+        await limiter.check("s1")
+        await limiter.check("s1")
+        with pytest.raises(RateLimitExceeded) as exc:
+            await limiter.check("s1")
+        assert exc.value.scope == "session"
+        await limiter.check("s2")
+
+    asyncio.run(scenario())
+
+
+def test_global_rejection_refunds_session_token():
+    limiter = make_limiter(global_rate=0.01, global_burst=1)
+
+    async def scenario():
+        await limiter.check("s1")
+        for _ in range(3):
+            with pytest.raises(RateLimitExceeded) as exc:
+                await limiter.check("s2")
+            assert exc.value.scope == "global"
+        # s2 has a burst of 2 and none of its requests went through
+        for _ in range(2):
+            limiter.backend.refund("global", 0.01, 1)
+            await limiter.check("s2")
+
+    asyncio.run(scenario())
+
+
+def test_check_fails_open_on_backend_error():
+    class BrokenBackend(MemoryBackend):
+        def consume(self, key, rate, capacity, cost=1.0):
+            raise sqlite3.OperationalError("database is locked")
+
+    asyncio.run(make_limiter(BrokenBackend()).check("s1"))
+
+
+@pytest.mark.parametrize("overrides", [
+    {"session_rate": 0},
+    {"global_rate": 0},
+    {"max_concurrency": 0},
+])
+def test_limiter_rejects_invalid_settings(overrides):
+    with pytest.raises(ValueError):
+        make_limiter(**overrides)
+
+
+def test_run_raises_busy_when_queue_times_out():
+    limiter = make_limiter()
+
+    async def slow():
+        await asyncio.sleep(0.2)
+        return "slow"
+
+    async def scenario():
+        return await asyncio.gather(limiter.run("a", slow), limiter.run("b", slow), return_exceptions=True)
+
+    first, second = asyncio.run(scenario())
+    assert first == "slow"
+    assert isinstance(second, LlmBusy)
+
+
+def test_run_coalesces_identical_keys():
+    limiter = make_limiter()
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def scenario():
+        return await asyncio.gather(limiter.run("same", factory), limiter.run("same", factory))
+
+    assert asyncio.run(scenario()) == ["answer", "answer"]
+    assert calls == 1
+    assert limiter._in_flight == {}
+
+
+def test_run_retrieves_exception_when_waiters_cancelled():
+    limiter = make_limiter()
+    loop_errors = []
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, ctx: loop_errors.append(ctx))
+        waiter = asyncio.ensure_future(limiter.run("k", failing))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert loop_errors == []
@@ -0,0 +1,113 @@
+import pytest
+
+import server
+from database import DEFAULT_SITE_ID
+
+
+@pytest.fixture
+def other_site(client):
+    return client.post("/api/sites", json={"name": "Plant B"}).json()["id"]
+
+
+def site(site_id):
+    return {"X-Site-ID": site_id}
+
+
+def create_equipment(client, site_id=DEFAULT_SITE_ID, **fields):
+    payload = {"name": "Press", "serial_number": "SN-1", "category": "Production", "location": "Floor A"}
+    payload.update(fields)
+    response = client.post("/api/equipment", json=payload, headers=site(site_id))
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_unknown_site_returns_404(client):
+    response = client.get("/api/equipment", headers=site("nowhere"))
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Site not found"
+
+
+def test_missing_header_uses_default_site(client):
+    equipment = create_equipment(client)
+    assert equipment["site_id"] == DEFAULT_SITE_ID
+    assert [e["id"] for e in client.get("/api/equipment").json()] == [equipment["id"]]
+
+
+def test_duplicate_site_name_returns_409(client, other_site):
+    response = client.post("/api/sites", json={"name": "Plant B"})
+    assert response.status_code == 409
+
+
+def test_equipment_is_scoped_to_site(client, other_site):
+    equipment = create_equipment(client)
+    path = f"/api/equipment/{equipment['id']}"
+
+    assert client.get("/api/equipment", headers=site(other_site)).json() == []
+    assert client.get(path, headers=site(other_site)).status_code == 404
+    payload = {"name": "Stolen", "serial_number": "SN-1", "category": "Production", "location": "Floor B"}
+    assert client.put(path, json=payload, headers=site(other_site)).status_code == 404
+    assert client.delete(path, headers=site(other_site)).status_code == 404
+    assert client.get(path).json()["name"] == "Press"
+
+
+def test_serial_numbers_are_unique_per_site(client, other_site):
+    create_equipment(client)
+    assert create_equipment(client, other_site)["site_id"] == other_site
+
+
+def test_teams_are_scoped_to_site(client, other_site):
+    team = client.post("/api/teams", json={"name": "Mechanical"}).json()
+    path = f"/api/teams/{team['id']}"
+
+    assert client.get("/api/teams", headers=site(other_site)).json() == []
+    assert client.get(path, headers=site(other_site)).status_code == 404
+    assert client.put(path, json={"name": "Renamed"}, headers=site(other_site)).status_code == 404
+
+    response = client.post(
+        "/api/equipment",
+        json={"name": "Press", "serial_number": "SN-2", "category": "Production",
+              "location": "Floor B", "maintenance_team_id": team["id"]},
+        headers=site(other_site),
+    )
+    assert response.status_code == 404
+
+
+def test_requests_are_scoped_to_site(client, other_site):
+    equipment = create_equipment(client)
+    payload = {"subject": "Leak", "request_type": "Corrective", "equipment_id": equipment["id"]}
+
+    assert client.post("/api/requests", json=payload, headers=site(other_site)).status_code == 404
+
+    request = client.post("/api/requests", json=payload).json()
+    path = f"/api/requests/{request['id']}"
+    assert client.get("/api/requests", headers=site(other_site)).json() == []
+    assert client.get(path, headers=site(other_site)).status_code == 404
+    assert client.put(path, json={"status": "Repaired"}, headers=site(other_site)).status_code == 404
+    assert client.delete(path, headers=site(other_site)).status_code == 404
+    assert client.get(f"/api/equipment/{equipment['id']}/requests", headers=site(other_site)).json() == []
+    assert client.get(path).json()["status"] == "New"
+
+
+def test_stats_are_cached_per_site_and_evicted_on_write(client, other_site):
+    equipment = create_equipment(client)
+    stats = client.get("/api/dashboard/stats").json()
+    assert stats["total_equipment"] == 1
+    assert stats["total_requests"] == 0
+    assert DEFAULT_SITE_ID in server.stats_cache
+
+    assert client.get("/api/dashboard/stats", headers=site(other_site)).json()["total_equipment"] == 0
+
+    payload = {"subject": "Leak", "request_type": "Corrective", "equipment_id": equipment["id"]}
+    request = client.post("/api/requests", json=payload).json()
+    assert DEFAULT_SITE_ID not in server.stats_cache
+    assert other_site in server.stats_cache
+
+    stats = client.get("/api/dashboard/stats").json()
+    assert stats["total_requests"] == 1
+    assert stats["active_requests"] == 1
+    assert stats["requests_by_type"]["Corrective"] == 1
+
+    client.put(f"/api/requests/{request['id']}", json={"status": "Repaired"})
+    stats = client.get("/api/dashboard/stats").json()
+    assert stats["active_requests"] == 0
+    assert stats["requests_by_status"]["Repaired"] == 1